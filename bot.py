@@ -1,14 +1,23 @@
 # bot.py
 
 import os
+import sys
+import asyncio
+import functools
+import hashlib
+import itertools
+import pickle
+import sqlite3
 import logging
+import unicodedata
+from collections import OrderedDict, deque
 from datetime import datetime, timezone
 
 # For loading environment variables from .env file
 from dotenv import load_dotenv
 
-# Google Gemini AI
-import google.generativeai as genai
+# For compressing the persisted message buffers
+import zstandard
 
 # Telegram Bot Library
 from telegram import Update, BotCommand
@@ -19,7 +28,8 @@ from telegram.ext import (
     MessageHandler,
     ContextTypes,
     filters,
-    PicklePersistence,
+    BasePersistence,
+    PersistenceInput,
     ApplicationBuilder
 )
 
@@ -27,10 +37,10 @@ from telegram.ext import (
 # Load environment variables from .env file
 load_dotenv()
 
-# Set up logging to see bot's activity
+# Set up logging to see bot's activity (set LOG_LEVEL=INFO or DEBUG in development)
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+    level=os.getenv("LOG_LEVEL", "WARNING").upper()
 )
 logger = logging.getLogger(__name__)
 
@@ -42,17 +52,319 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if not TELEGRAM_TOKEN or not GEMINI_API_KEY:
     raise ValueError("TELEGRAM_TOKEN and GEMINI_API_KEY must be set in the .env file.")
 
-# Configure the Gemini API
-genai.configure(api_key=GEMINI_API_KEY)
+# The instructions never change between calls, so they are sent once as the
+# model's system instruction and only the chat history goes in each request.
+TLDR_SYSTEM_INSTRUCTION = (
+    "You are a helpful assistant in a Telegram group chat. Your task is to provide a concise summary (a TL;DR) "
+    "of the conversation you are given.\n"
+    "The summary should be clear, easy to read, and presented in a few bullet points using markdown dashes (-) "
+    "or asterisks (*).\n"
+    "Do not add any extra commentary before or after the summary. Just provide the bullet points."
+)
+
 # Using a specific model known for good text generation
-gemini_model = genai.GenerativeModel('gemini-1.5-flash-latest')
+GEMINI_MODEL_NAME = 'gemini-1.5-flash-latest'
+
+# The Gemini SDK is heavy to import, so it is only loaded and configured on the first /tldr
+_gemini_model = None
+
+def get_gemini_model():
+    """Returns the shared Gemini model, importing and configuring the SDK on first use."""
+    global _gemini_model
+    if _gemini_model is None:
+        # Google Gemini AI
+        import google.generativeai as genai
+
+        # Configure the Gemini API
+        genai.configure(api_key=GEMINI_API_KEY)
+        _gemini_model = genai.GenerativeModel(
+            GEMINI_MODEL_NAME,
+            system_instruction=TLDR_SYSTEM_INSTRUCTION
+        )
+    return _gemini_model
+
+# Cap on concurrent Gemini requests across all chats, so a burst of /tldr
+# commands queues up here instead of hitting the API's rate limits
+GEMINI_SEMAPHORE = asyncio.Semaphore(int(os.getenv("GEMINI_CONCURRENCY", "6")))
 
 # --- Bot State and Constants ---
 # This dictionary will hold message buffers for each chat
-# Structure: {chat_id: [(timestamp, author, text), ...]}
-# We use a dictionary in bot_data provided by PicklePersistence for persistence
+# Structure: {chat_id: {"ts": deque([epoch, ...]), "author": deque([...]), "text": deque([...]), "rev": int}}
+# The three deques are parallel (same index = same message) and share the same maxlen,
+# which keeps the pickled state small compared to one (datetime, author, text) tuple per message.
+# "rev" is bumped by mark_buffer_changed() on every change, so persistence can tell which buffers to write.
+# We use a dictionary in bot_data, persisted by SqlitePersistence below
 MESSAGE_BUFFER_KEY = "message_buffer"
 MAX_BUFFER_SIZE = 150  # Max messages to store before summarizing
+SHORT_TEXT_LENGTH = 32  # Texts shorter than this ("lol", "yes") repeat often and are shared
+
+@functools.lru_cache(maxsize=1024)
+def shared_string(value):
+    """Returns the first-seen string equal to value, so repeats share one object.
+
+    Unlike sys.intern, the cache is bounded, so arbitrary user text can't pile up in memory.
+    """
+    return value
+
+def share_text(text):
+    """Returns a shared copy of short message texts; longer ones rarely repeat and are kept as-is."""
+    return shared_string(text) if len(text) < SHORT_TEXT_LENGTH else text
+
+# Messages shorter than this ("ok", "ya") add nothing to a summary and are not stored
+MIN_MESSAGE_LENGTH = 3
+# Unicode categories that make up emoji sequences (symbols, skin tones, variation selectors, joiners, spaces)
+EMOJI_CATEGORIES = frozenset({"So", "Sk", "Mn", "Cf", "Zs"})
+
+# Upper bound on the conversation sent to Gemini (~8k tokens); older messages are dropped first
+MAX_CONVERSATION_CHARS = 32000
+
+# Counts stored messages across all chats, used to log progress only every LOG_EVERY_N_MESSAGES
+stored_message_counter = itertools.count(1)
+LOG_EVERY_N_MESSAGES = 25
+
+# Recent summaries keyed by the SHA-256 of the model name, system instruction and prompt,
+# so summarizing the exact same conversation twice doesn't cost a second Gemini call,
+# while changing the model or instructions doesn't serve summaries made with the old ones
+# Structure: OrderedDict({sha256_digest: summary, ...}), least recently used first
+SUMMARY_CACHE_KEY = "summary_cache"
+SUMMARY_CACHE_SIZE = 512
+
+# Revision counters of the other bot_data entries, bumped by mark_bot_data_changed()
+# Structure: {key: revision, ...}; not persisted itself
+REVISIONS_KEY = "revisions"
+
+# Header of the TL;DR reply, already valid MarkdownV2 so only the AI summary needs escaping
+TLDR_HEADER_TEMPLATE = "*📜 TL;DR of the last {n} messages:*\n\n"
+
+def new_message_buffer(messages=(), revision=0):
+    """Creates an empty per-chat buffer, optionally seeded with (timestamp, author, text) tuples."""
+    buffer = {
+        "ts": deque(maxlen=MAX_BUFFER_SIZE),
+        "author": deque(maxlen=MAX_BUFFER_SIZE),
+        "text": deque(maxlen=MAX_BUFFER_SIZE),
+        "rev": revision,
+    }
+    for timestamp, author, text in messages:
+        if isinstance(timestamp, datetime):
+            timestamp = int(timestamp.timestamp())
+        buffer["ts"].append(timestamp)
+        buffer["author"].append(shared_string(author))
+        buffer["text"].append(share_text(text))
+    return buffer
+
+def mark_buffer_changed(buffer):
+    """Bumps the revision of a chat buffer so that it is written on the next flush."""
+    buffer["rev"] += 1
+
+def mark_bot_data_changed(bot_data, key):
+    """Bumps the revision of a bot_data entry so that it is written on the next flush."""
+    revisions = bot_data.setdefault(REVISIONS_KEY, {})
+    revisions[key] = revisions.get(key, 0) + 1
+
+# --- Persistence ---
+
+class SqlitePersistence(BasePersistence):
+    """Persists bot_data in a SQLite database, one row per chat buffer.
+
+    PicklePersistence rewrites the whole state on every flush. Here each chat's
+    message buffer is pickled into its own row of ``message_buffers`` and every
+    other bot_data key into its own row of ``bot_data``, and a row is only
+    written when its contents changed since the last flush. Handlers call
+    mark_buffer_changed() after touching a buffer, and mark_bot_data_changed()
+    after changing any other bot_data entry. Rows whose revision matches the
+    last one written are not even re-pickled. The revisions travel inside the
+    bot_data copy PTB hands to update_bot_data, so a change made while a flush
+    is pending is never mistaken for written. Rows are zstd-compressed, since chat text repeats a lot.
+    Only bot_data is stored, since that is all this bot uses.
+
+    If the database is empty and ``legacy_filepath`` points to an existing
+    PicklePersistence file, its bot_data is loaded once and written to the
+    database on the first flush.
+    """
+
+    def __init__(self, filepath, update_interval=60, legacy_filepath=None):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=True, chat_data=False, user_data=False, callback_data=False),
+            update_interval=update_interval
+        )
+        self.filepath = filepath
+        self.legacy_filepath = legacy_filepath
+        self._connection = sqlite3.connect(filepath)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS bot_data (key TEXT PRIMARY KEY, value BLOB NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS message_buffers (chat_id INTEGER PRIMARY KEY, buffer BLOB NOT NULL)"
+            )
+        self._compressor = zstandard.ZstdCompressor()
+        self._decompressor = zstandard.ZstdDecompressor()
+        # (revision, digest of the pickle) last written for each row, keyed by (table, key)
+        self._written = {}
+
+    async def get_bot_data(self):
+        bot_data = {}
+        for key, value in self._connection.execute("SELECT key, value FROM bot_data"):
+            value = self._decompressor.decompress(value)
+            bot_data[key] = pickle.loads(value)
+            # Revisions of these entries aren't stored and restart from 0
+            self._written[("bot_data", key)] = (0, hashlib.blake2b(value).digest())
+
+        buffers = bot_data.setdefault(MESSAGE_BUFFER_KEY, {})
+        for chat_id, buffer in self._connection.execute("SELECT chat_id, buffer FROM message_buffers"):
+            buffer = self._decompressor.decompress(buffer)
+            buffers[chat_id] = pickle.loads(buffer)
+            self._written[("message_buffers", chat_id)] = (
+                buffers[chat_id].get("rev", 0), hashlib.blake2b(buffer).digest()
+            )
+
+        if not self._written and self.legacy_filepath and os.path.exists(self.legacy_filepath):
+            # Nothing stored yet: carry over the state from the old pickle file (post_init converts the buffers)
+            with open(self.legacy_filepath, "rb") as file:
+                bot_data = pickle.load(file).get("bot_data") or {}
+            bot_data.setdefault(MESSAGE_BUFFER_KEY, {})
+            logger.info("Imported bot_data from legacy persistence file %s", self.legacy_filepath)
+        return bot_data
+
+    async def update_bot_data(self, data):
+        revisions = data.get(REVISIONS_KEY, {})
+        current = {
+            ("message_buffers", chat_id): (buffer.get("rev", 0), buffer)
+            for chat_id, buffer in data.get(MESSAGE_BUFFER_KEY, {}).items()
+        }
+        current.update(
+            (("bot_data", key), (revisions.get(key, 0), value))
+            for key, value in data.items()
+            if key not in (MESSAGE_BUFFER_KEY, REVISIONS_KEY)
+        )
+
+        # Bookkeeping is only updated once the transaction has committed, so that
+        # rows from a failed write keep their old revision and are retried on the next flush
+        written = {}
+        deleted = self._written.keys() - current.keys()
+        with self._connection:
+            for row, (revision, value) in current.items():
+                table, key = row
+                last_written = self._written.get(row)
+                # Only re-pickle rows that changed or have never been written
+                if last_written is not None and last_written[0] == revision:
+                    continue
+                blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+                digest = hashlib.blake2b(blob).digest()
+                written[row] = (revision, digest)
+                if last_written is not None and last_written[1] == digest:
+                    continue
+                compressed = self._compressor.compress(blob)
+                if table == "message_buffers":
+                    self._connection.execute(
+                        "INSERT OR REPLACE INTO message_buffers (chat_id, buffer) VALUES (?, ?)", (key, compressed)
+                    )
+                else:
+                    self._connection.execute(
+                        "INSERT OR REPLACE INTO bot_data (key, value) VALUES (?, ?)", (key, compressed)
+                    )
+
+            for table, key in deleted:
+                if table == "message_buffers":
+                    self._connection.execute("DELETE FROM message_buffers WHERE chat_id = ?", (key,))
+                else:
+                    self._connection.execute("DELETE FROM bot_data WHERE key = ?", (key,))
+
+        self._written.update(written)
+        for row in deleted:
+            del self._written[row]
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        self._connection.close()
+
+    # chat_data, user_data, callback_data and conversations are not stored
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_user_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        return {}
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_user_data(self, user_id, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def update_conversation(self, name, key, new_state):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def drop_user_data(self, user_id):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+# --- Summarization ---
+
+def fit_to_budget(message_buffer, max_chars=MAX_CONVERSATION_CHARS):
+    """Returns the newest (author, text) pairs whose formatted lines fit in max_chars, oldest first."""
+    messages = []
+    used = 0
+    for author, text in zip(reversed(message_buffer["author"]), reversed(message_buffer["text"])):
+        used += len(author) + len(text) + 3 # ": " and the newline joining the lines
+        if used > max_chars:
+            if not messages:
+                # Always keep the newest message, cut down to the budget
+                messages.append((author, text[:max(0, max_chars - len(author) - 3)]))
+            break
+        messages.append((author, text))
+    messages.reverse()
+    return messages
+
+def build_prompt(conversation):
+    """Returns the Gemini prompt for a conversation; the instructions are in the system instruction."""
+    return f"Here is the chat history:\n---\n{conversation}\n---"
+
+def summary_cache_key(conversation):
+    """Returns the summary cache key, covering everything that shapes Gemini's answer."""
+    prompt = build_prompt(conversation)
+    return hashlib.sha256(f"{GEMINI_MODEL_NAME}\0{TLDR_SYSTEM_INSTRUCTION}\0{prompt}".encode()).digest()
+
+async def summarize(conversation, context):
+    """Returns a Gemini summary of the conversation, reusing the cached one if it was delivered before."""
+    cache = context.bot_data.get(SUMMARY_CACHE_KEY, {})
+    key = summary_cache_key(conversation)
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+
+    async with GEMINI_SEMAPHORE:
+        response = await get_gemini_model().generate_content_async(build_prompt(conversation))
+    return response.text
+
+def cache_summary(conversation, summary, context):
+    """Remembers a summary once it was delivered, so a summary Telegram rejected is never replayed."""
+    cache = context.bot_data.setdefault(SUMMARY_CACHE_KEY, OrderedDict())
+    cache[summary_cache_key(conversation)] = summary
+    if len(cache) > SUMMARY_CACHE_SIZE:
+        cache.popitem(last=False) # Evict the least recently used summary
+    mark_bot_data_changed(context.bot_data, SUMMARY_CACHE_KEY)
 
 # --- Bot Command Handlers ---
 
@@ -60,7 +372,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Sends a welcome message when the /start command is issued."""
     # Initialize the message buffer for this chat if it doesn't exist
     context.bot_data.setdefault(MESSAGE_BUFFER_KEY, {})
-    context.bot_data[MESSAGE_BUFFER_KEY].setdefault(update.effective_chat.id, [])
+    context.bot_data[MESSAGE_BUFFER_KEY].setdefault(update.effective_chat.id, new_message_buffer())
     
     await update.message.reply_text(
         "👋 Hello! I'm your TLDR Bot.\n\n"
@@ -85,56 +397,53 @@ async def store_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     text = update.message.text
 
-    # Ignore empty messages
-    if not text:
+    # Ignore empty, very short and emoji-only messages
+    if len(text) < MIN_MESSAGE_LENGTH or all(unicodedata.category(char) in EMOJI_CATEGORIES for char in text):
         return
 
     # Initialize buffer for the chat if it's new
     context.bot_data.setdefault(MESSAGE_BUFFER_KEY, {})
     if chat_id not in context.bot_data[MESSAGE_BUFFER_KEY]:
-        context.bot_data[MESSAGE_BUFFER_KEY][chat_id] = []
+        context.bot_data[MESSAGE_BUFFER_KEY][chat_id] = new_message_buffer()
         logger.info(f"Initialized new message buffer for chat_id: {chat_id}")
 
     # Prepare message details
-    author = user.first_name or user.username
-    timestamp = datetime.now(timezone.utc)
+    # Author names repeat on almost every message, so share one string object per name
+    author = shared_string(user.first_name or user.username)
+    timestamp = int(datetime.now(timezone.utc).timestamp())
     
-    # Add message to the buffer
-    message_data = (timestamp, author, text)
-    context.bot_data[MESSAGE_BUFFER_KEY][chat_id].append(message_data)
-    logger.info(f"Stored message from {author} in chat {chat_id}")
-
-    # Keep the buffer from growing too large
-    while len(context.bot_data[MESSAGE_BUFFER_KEY][chat_id]) > MAX_BUFFER_SIZE:
-        context.bot_data[MESSAGE_BUFFER_KEY][chat_id].pop(0) # Remove the oldest message
+    # Add message to the buffer (the deques' maxlen drops the oldest message once full)
+    message_buffer = context.bot_data[MESSAGE_BUFFER_KEY][chat_id]
+    message_buffer["ts"].append(timestamp)
+    message_buffer["author"].append(author)
+    message_buffer["text"].append(share_text(text))
+    mark_buffer_changed(message_buffer)
+    logger.debug("Stored message from %s in chat %s", author, chat_id)
+    stored_count = next(stored_message_counter)
+    if stored_count % LOG_EVERY_N_MESSAGES == 0:
+        logger.info("Stored %d messages since startup", stored_count)
 
 async def tldr_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Generates and sends a TLDR summary."""
     chat_id = update.effective_chat.id
-    message_buffer = context.bot_data.get(MESSAGE_BUFFER_KEY, {}).get(chat_id, [])
+    message_buffer = context.bot_data.get(MESSAGE_BUFFER_KEY, {}).get(chat_id) or new_message_buffer()
+    message_count = len(message_buffer["text"])
 
-    if len(message_buffer) < 3:
+    if message_count < 3:
         await update.message.reply_text("There aren't enough messages to summarize yet. Keep chatting!")
         return
 
-    processing_message = await update.message.reply_text(f"🧠 Got it. Summarizing the last {len(message_buffer)} messages...")
+    # Very long conversations are trimmed from the oldest end to keep the request small
+    messages = fit_to_budget(message_buffer)
+    message_count = len(messages)
 
-    conversation = "\n".join([f"{author}: {text}" for _, author, text in message_buffer])
-    
-    prompt = f"""
-    You are a helpful assistant in a Telegram group chat. Your task is to provide a concise summary (a TL;DR) of the following conversation.
-    The summary should be clear, easy to read, and presented in a few bullet points using markdown dashes (-) or asterisks (*).
-    Do not add any extra commentary before or after the summary. Just provide the bullet points.
-
-    Here is the chat history:
-    ---
-    {conversation}
-    ---
-    """
+    processing_message = await update.message.reply_text(f"🧠 Got it. Summarizing the last {message_count} messages...")
 
+    conversation = "\n".join(f"{author}: {text}" for author, text in messages)
+
+    processing_message_deleted = False
     try:
-        response = await gemini_model.generate_content_async(prompt)
-        summary = response.text
+        summary = await summarize(conversation, context)
 
         # --- CHANGE 1: ESCAPE THE AI-GENERATED SUMMARY ---
         # This will protect against any special markdown characters in the AI's response.
@@ -143,29 +452,58 @@ async def tldr_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         # --- CHANGE 2: USE THE ESCAPED SUMMARY AND PARSE_MODE='MarkdownV2' ---
         # Note: We now use 'MarkdownV2' which is stricter and works with the escape_markdown helper.
-        # Our own manually-added formatting (like the bold title) is safe because we typed it correctly.
-        final_text = f"**📜 TL;DR of the last {len(message_buffer)} messages:**\n\n{escaped_summary}"
-        
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=final_text,
-            parse_mode='MarkdownV2' # Using the more modern and reliable MarkdownV2
+        # Our own manually-added formatting (like the bold title) is safe because it is prebuilt in TLDR_HEADER_TEMPLATE.
+        final_text = TLDR_HEADER_TEMPLATE.format(n=message_count) + escaped_summary
+
+        # Send the summary and remove the "processing" message at the same time
+        processing_message_deleted = True
+        send_result, delete_result = await asyncio.gather(
+            context.bot.send_message(
+                chat_id=chat_id,
+                text=final_text,
+                parse_mode='MarkdownV2' # Using the more modern and reliable MarkdownV2
+            ),
+            processing_message.delete(),
+            return_exceptions=True
         )
-
-        context.bot_data[MESSAGE_BUFFER_KEY][chat_id] = []
+        # A leftover "processing" message is harmless, but a summary that wasn't sent is an error
+        if isinstance(delete_result, Exception):
+            logger.warning(f"Could not delete the processing message in chat {chat_id}: {delete_result}")
+        if isinstance(send_result, Exception):
+            raise send_result
+
+        cache_summary(conversation, summary, context)
+        for column in ("ts", "author", "text"):
+            message_buffer[column].clear()
+        mark_buffer_changed(message_buffer)
         logger.info(f"Successfully summarized and cleared buffer for chat {chat_id}")
 
     except Exception as e:
         logger.error(f"Error generating summary for chat {chat_id}: {e}")
-        await context.bot.send_message(
+        error_reply = context.bot.send_message(
             chat_id=chat_id,
             text="😥 Sorry, I ran into an error while trying to create the summary. Please try again later."
         )
-    finally:
-        await processing_message.delete()
+        if processing_message_deleted:
+            await error_reply
+        else:
+            await asyncio.gather(error_reply, processing_message.delete())
 
 async def post_init(application: Application):
     """Set the bot's commands after initialization."""
+    # Older persistence files stored each buffer as a list or deque of
+    # (timestamp, author, text) tuples; convert them to the column layout.
+    # Unpickled strings are separate objects again, so share the loaded ones too.
+    buffers = application.bot_data.get(MESSAGE_BUFFER_KEY, {})
+    for chat_id, messages in buffers.items():
+        if isinstance(messages, dict):
+            buffers[chat_id] = new_message_buffer(
+                zip(messages["ts"], messages["author"], messages["text"]),
+                revision=messages.get("rev", 0)
+            )
+        else:
+            buffers[chat_id] = new_message_buffer(messages)
+
     await application.bot.set_my_commands([
         BotCommand("start", "Start the bot and get a welcome message"),
         BotCommand("tldr", "Summarize the recent conversation"),
@@ -176,21 +514,40 @@ async def post_init(application: Application):
 
 def main():
     """Start the bot."""
+    # uvloop is a faster drop-in replacement for the asyncio event loop (not available on Windows).
+    # The policy is set before anything else so the Application is built and run on uvloop.
+    if sys.platform != 'win32':
+        try:
+            import uvloop
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        except ImportError:
+            logger.info("uvloop is not installed, using the default asyncio event loop.")
+
      # --- MODIFICATION FOR RENDER ---
     # On-Demand disks are mounted at a specific path, e.g., /var/data
     # We get this path from an environment variable for flexibility.
-    persistence_path = os.path.join(
-        os.getenv("RENDER_DISK_MOUNT_PATH", "."), # Default to current dir if var not set
-        "tldr_bot_data.pkl"
-    )
+    persistence_dir = os.getenv("RENDER_DISK_MOUNT_PATH", ".") # Default to current dir if var not set
+    persistence_path = os.path.join(persistence_dir, "tldr_bot_data.sqlite3")
     print(f"Using persistence file at: {persistence_path}") # Good for debugging
-    persistence = PicklePersistence(filepath=persistence_path)
+    # Buffers are written in batches every update_interval seconds (and once more on shutdown),
+    # no matter how many messages arrive in between
+    persistence = SqlitePersistence(
+        filepath=persistence_path,
+        update_interval=float(os.getenv("PERSISTENCE_UPDATE_INTERVAL", "60")),
+        # The pickle file used before the switch to SQLite, imported on first start
+        legacy_filepath=os.path.join(persistence_dir, "tldr_bot_data.pkl")
+    )
     # --- END MODIFICATION ---
 
     # Create the Application and pass it your bot's token.
+    # HTTP/2 lets the regular Bot API requests share one kept-alive connection, which is
+    # opened once by the get_me call in Application.initialize. Long polling stays on
+    # HTTP/1.1: its requests get cancelled routinely, which h2 doesn't handle reliably.
     application = (
         ApplicationBuilder()
         .token(TELEGRAM_TOKEN)
+        .http_version("2")
+        .get_updates_http_version("1.1")
         .persistence(persistence)
         .post_init(post_init)
         .build()
@@ -202,8 +559,16 @@ def main():
     application.add_handler(CommandHandler("tldr", tldr_command))
     
     # Add a message handler to store all non-command text messages
-    # The `& (~filters.COMMAND)` part ensures we don't store commands themselves
-    application.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), store_message))
+    # The `& (~filters.COMMAND)` part ensures we don't store commands themselves,
+    # and edits, forwards and inline-bot messages are filtered out before store_message runs
+    store_filter = (
+        filters.TEXT
+        & (~filters.COMMAND)
+        & (~filters.UpdateType.EDITED)
+        & (~filters.FORWARDED)
+        & (~filters.VIA_BOT)
+    )
+    application.add_handler(MessageHandler(store_filter, store_message))
     
     # Run the bot until the user presses Ctrl-C
     logger.info("Bot is starting... Press Ctrl-C to stop.")
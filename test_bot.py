@@ -0,0 +1,131 @@
+# test_bot.py
+
+import os
+import copy
+import pickle
+import asyncio
+import sqlite3
+from datetime import datetime, timezone
+
+# bot.py refuses to import without these, but the persistence tests never talk to the APIs
+os.environ.setdefault("TELEGRAM_TOKEN", "123:test")
+os.environ.setdefault("GEMINI_API_KEY", "test")
+
+import bot
+
+
+def reopen(path, **kwargs):
+    """Opens the database at path with a fresh SqlitePersistence and returns it with its bot_data."""
+    persistence = bot.SqlitePersistence(str(path), **kwargs)
+    return persistence, asyncio.run(persistence.get_bot_data())
+
+
+def texts(bot_data, chat_id):
+    return list(bot_data[bot.MESSAGE_BUFFER_KEY][chat_id]["text"])
+
+
+def test_round_trip(tmp_path):
+    persistence, bot_data = reopen(tmp_path / "data.sqlite3")
+    bot_data[bot.MESSAGE_BUFFER_KEY][1] = bot.new_message_buffer([(1, "zal", "hello"), (2, "ali", "hi there")])
+    bot_data["other"] = {"answer": 42}
+    asyncio.run(persistence.update_bot_data(bot_data))
+    asyncio.run(persistence.flush())
+
+    _, loaded = reopen(tmp_path / "data.sqlite3")
+    assert texts(loaded, 1) == ["hello", "hi there"]
+    assert list(loaded[bot.MESSAGE_BUFFER_KEY][1]["author"]) == ["zal", "ali"]
+    assert loaded["other"] == {"answer": 42}
+
+
+def test_only_changed_chats_are_rewritten(tmp_path):
+    persistence, bot_data = reopen(tmp_path / "data.sqlite3")
+    buffers = bot_data[bot.MESSAGE_BUFFER_KEY]
+    buffers[1] = bot.new_message_buffer([(1, "zal", "hello")])
+    buffers[2] = bot.new_message_buffer([(1, "ali", "hey")])
+    asyncio.run(persistence.update_bot_data(bot_data))
+
+    buffers[1]["text"].append("marked")
+    buffers[2]["text"].append("not marked")
+    bot.mark_buffer_changed(buffers[1])
+    asyncio.run(persistence.update_bot_data(bot_data))
+    asyncio.run(persistence.flush())
+
+    _, loaded = reopen(tmp_path / "data.sqlite3")
+    assert texts(loaded, 1) == ["hello", "marked"]
+    assert texts(loaded, 2) == ["hey"]
+
+
+def test_change_during_pending_flush_is_written_later(tmp_path):
+    persistence, bot_data = reopen(tmp_path / "data.sqlite3")
+    bot_data[bot.MESSAGE_BUFFER_KEY][1] = bot.new_message_buffer([(1, "zal", "hello")])
+    bot_data["other"] = [1]
+    asyncio.run(persistence.update_bot_data(copy.deepcopy(bot_data)))
+
+    # PTB copies bot_data, then a handler runs before update_bot_data gets the copy
+    snapshot = copy.deepcopy(bot_data)
+    bot_data[bot.MESSAGE_BUFFER_KEY][1]["text"].append("late")
+    bot.mark_buffer_changed(bot_data[bot.MESSAGE_BUFFER_KEY][1])
+    bot_data["other"].append(2)
+    bot.mark_bot_data_changed(bot_data, "other")
+    asyncio.run(persistence.update_bot_data(snapshot))
+    asyncio.run(persistence.update_bot_data(copy.deepcopy(bot_data)))
+    asyncio.run(persistence.flush())
+
+    _, loaded = reopen(tmp_path / "data.sqlite3")
+    assert texts(loaded, 1) == ["hello", "late"]
+    assert loaded["other"] == [1, 2]
+    assert bot.REVISIONS_KEY not in loaded
+
+
+def test_failed_write_is_retried(tmp_path):
+    persistence, bot_data = reopen(tmp_path / "data.sqlite3")
+    bot_data[bot.MESSAGE_BUFFER_KEY][1] = bot.new_message_buffer([(1, "zal", "hello")])
+    asyncio.run(persistence.update_bot_data(bot_data))
+
+    bot_data[bot.MESSAGE_BUFFER_KEY][1]["text"].append("again")
+    bot.mark_buffer_changed(bot_data[bot.MESSAGE_BUFFER_KEY][1])
+    connection = persistence._connection
+    persistence._connection = sqlite3.connect(str(tmp_path / "data.sqlite3"))
+    persistence._connection.execute("PRAGMA query_only=ON")
+    try:
+        asyncio.run(persistence.update_bot_data(bot_data))
+    except sqlite3.OperationalError:
+        pass
+    persistence._connection = connection
+
+    asyncio.run(persistence.update_bot_data(bot_data))
+    asyncio.run(persistence.flush())
+
+    _, loaded = reopen(tmp_path / "data.sqlite3")
+    assert texts(loaded, 1) == ["hello", "again"]
+
+
+def test_legacy_pickle_is_imported_once(tmp_path):
+    legacy_path = tmp_path / "data.pkl"
+    timestamp = datetime(2025, 7, 4, tzinfo=timezone.utc)
+    with open(legacy_path, "wb") as file:
+        pickle.dump({"bot_data": {bot.MESSAGE_BUFFER_KEY: {1: [(timestamp, "zal", "yow")]}}}, file)
+
+    persistence, bot_data = reopen(tmp_path / "data.sqlite3", legacy_filepath=str(legacy_path))
+    assert bot_data[bot.MESSAGE_BUFFER_KEY][1] == [(timestamp, "zal", "yow")]
+
+    # post_init converts the old tuples before the first flush writes them
+    bot_data[bot.MESSAGE_BUFFER_KEY][1] = bot.new_message_buffer(bot_data[bot.MESSAGE_BUFFER_KEY][1])
+    asyncio.run(persistence.update_bot_data(bot_data))
+    asyncio.run(persistence.flush())
+
+    with open(legacy_path, "wb") as file:
+        pickle.dump({"bot_data": {bot.MESSAGE_BUFFER_KEY: {1: [(timestamp, "zal", "stale")]}}}, file)
+    _, loaded = reopen(tmp_path / "data.sqlite3", legacy_filepath=str(legacy_path))
+    assert texts(loaded, 1) == ["yow"]
+    assert list(loaded[bot.MESSAGE_BUFFER_KEY][1]["ts"]) == [int(timestamp.timestamp())]
+
+
+def test_fit_to_budget_keeps_newest_messages_within_budget():
+    buffer = bot.new_message_buffer([(1, "a", "x" * 10), (2, "b", "y" * 10), (3, "c", "z" * 10)])
+    assert bot.fit_to_budget(buffer, max_chars=28) == [("b", "y" * 10), ("c", "z" * 10)]
+
+    # A single oversized newest message is cut so that its "author: text" line still fits
+    messages = bot.fit_to_budget(buffer, max_chars=8)
+    assert messages == [("c", "z" * 4)]
+    assert len("\n".join(f"{author}: {text}" for author, text in messages)) <= 8